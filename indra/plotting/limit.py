@@ -58,7 +58,7 @@ def get_commutator_fps(gens):
     return beg_pts[-1], end_pts
 
 
-def dfs(gens, beg_prefix='a', end_prefix='b', max_level=MAX_LEVEL, eps=VISUAL_EPS, debug=False):
+def dfs(gens, beg_prefix='a', end_prefix='b', max_level=MAX_LEVEL, eps=VISUAL_EPS, debug=False, cancelled=None):
     """
     Non-recursive DFS for plotting limit set (only for 4 generators).
 
@@ -68,6 +68,7 @@ def dfs(gens, beg_prefix='a', end_prefix='b', max_level=MAX_LEVEL, eps=VISUAL_EP
     :param max_level: max level to plot
     :param eps: tolerance for termination
     :param debug: debug prints
+    :param cancelled: optional callable, checked once per branch; traversal stops early when it returns true
     :return: complex points to plot
     """
     beg_tags = word_to_tags(beg_prefix)
@@ -89,6 +90,9 @@ def dfs(gens, beg_prefix='a', end_prefix='b', max_level=MAX_LEVEL, eps=VISUAL_EP
     old_pt, fps = get_commutator_fps(gens)
 
     while True:
+        if cancelled is not None and cancelled():
+            return
+
         # go forwards till the end of the branch
         while True:
             old_pt, branch_term = branch_termination(words[-1], fps[tags[-1]], old_pt, eps, level, max_level)
@@ -40,27 +40,32 @@ def plot_tiles(gens, circs, ax=None, plot_level=None, eps=VISUAL_EPS):
     return ax
 
 
-def dfs_tiles(gens, circs, max_level, eps):
+def dfs_tiles(gens, circs, max_level, eps, cancelled=None):
     """
     Iterate through tiles with depth-first search.
 
     :param gens: list of generating Mobius transformations
     :param circs: seed circles to start with
     :param eps: minimum radius size to return
+    :param cancelled: optional callable, checked once per node; traversal stops early when it returns true
     :return: circle and corresponding level
     """
     for k in range(len(gens)):
+        if cancelled is not None and cancelled():
+            return
         yield circs[k], 0
-        yield from explore_tree_tiles(gens[k], k, circs[k], 1, gens, max_level, eps)
+        yield from explore_tree_tiles(gens[k], k, circs[k], 1, gens, max_level, eps, cancelled)
 
 
-def explore_tree_tiles(X, l, C, level, gens, max_level, eps):
+def explore_tree_tiles(X, l, C, level, gens, max_level, eps, cancelled=None):
     if max_level is not None and level > max_level:
         return
     n = len(gens)
     for k in range(l - 1, l + 2):
+        if cancelled is not None and cancelled():
+            return
         Y = X(gens[k % n])
         new_circ = Y(C)
         yield new_circ, level
         if new_circ.radius > eps:
-            yield from explore_tree_tiles(Y, k, C, level + 1, gens, max_level, eps)
+            yield from explore_tree_tiles(Y, k, C, level + 1, gens, max_level, eps, cancelled)
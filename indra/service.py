@@ -0,0 +1,314 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import weakref
+
+import numpy as np
+
+from .common import VISUAL_EPS, MAX_LEVEL, Circle
+from .plotting.limit import dfs
+from .plotting.tiles import dfs_tiles
+
+
+class RenderCancelled(Exception):
+    """Raised in a stream whose request was superseded or cancelled before it finished"""
+
+
+class _Job:
+
+    def __init__(self, key):
+        self.key = key
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.refs = 0
+        self.future = None
+        # read from the worker thread, so must be thread-safe
+        self.cancelled = threading.Event()
+        self._updated = asyncio.Event()
+
+    def push(self, chunk):
+        self.chunks.append(chunk)
+        self.notify()
+
+    def finish(self, error=None):
+        self.done = True
+        self.error = error
+        self.notify()
+
+    def notify(self):
+        # wake everyone waiting and start a fresh event for the next update
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def wait(self):
+        await self._updated.wait()
+
+
+class RenderStream:
+    """
+    Async iterator over the chunks of a single render request.
+
+    Nothing is computed until the first chunk is requested. Leaving an
+    `async with` block, calling `aclose`, cancelling the consuming task or
+    dropping the last reference releases the request, which cancels the
+    traversal if no other stream is waiting on it.
+    """
+
+    def __init__(self, service, key, run, channel):
+        self.key = key
+        self.channel = channel
+        self.superseded = False
+        self.closed = False
+        self._service = service
+        self._run = run
+        self._job = None
+        self._finalizer = None
+        self._i = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._next()
+        except asyncio.CancelledError:
+            self._release()
+            raise
+
+    async def _next(self):
+        if self.superseded:
+            raise RenderCancelled('request superseded')
+        if self.closed:
+            raise StopAsyncIteration
+        if self._job is None:
+            self._attach(self._service._join(self.key, self._run))
+
+        job = self._job
+        while True:
+            if self.superseded:
+                raise RenderCancelled('request superseded')
+            if self._i < len(job.chunks):
+                chunk = job.chunks[self._i]
+                self._i += 1
+                return chunk
+            if job.done:
+                self._release()
+                if job.error is not None:
+                    raise job.error
+                if job.cancelled.is_set():
+                    raise RenderCancelled('request cancelled')
+                raise StopAsyncIteration
+            await job.wait()
+
+    def _attach(self, job):
+        """Hold a reference on job until this stream is released or collected"""
+        self._job = job
+        # garbage collection may happen in any thread, so hand the release to the loop
+        self._finalizer = weakref.finalize(self, _release_threadsafe, asyncio.get_running_loop(), self._service, job)
+        self._finalizer.atexit = False
+
+    def _release(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._service._drop_channel(self)
+        # detach succeeds at most once, so this can't race with garbage collection
+        if self._finalizer is not None and self._finalizer.detach() is not None:
+            self._service._release(self._job)
+
+    def _supersede(self):
+        self.superseded = True
+        self._release()
+        if self._job is not None:
+            self._job.notify()
+
+    async def aclose(self):
+        """Release the request, cancelling its traversal if nobody else needs it"""
+        self._release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+class RenderService:
+    """
+    Asyncio front end for the limit set and tile traversals.
+
+    Each request runs in an executor thread and is streamed back in chunks.
+    Identical in-flight requests share one computation, and a new request on a
+    channel supersedes the previous request on that channel, cancelling its
+    traversal once nobody else is waiting on it.
+
+    The engines have no notion of a viewport, so requests are identified by
+    exactly the arguments passed to the traversal: generators, prefixes or seed
+    circles, max level and eps.
+    """
+
+    def __init__(self, executor=None, chunk_size=256):
+        """
+        :param executor: optional thread pool to run traversals in
+        :param chunk_size: number of results per streamed chunk
+        """
+        self._own_executor = executor is None
+        self._executor = executor if executor is not None else ThreadPoolExecutor()
+        self.chunk_size = chunk_size
+        self._closed = False
+        self._jobs = {}
+        self._channels = {}
+
+    def limit_set(self, gens, beg_prefix='a', end_prefix='b', max_level=MAX_LEVEL, eps=VISUAL_EPS, channel=None):
+        """
+        Stream points of the limit set, as computed by `dfs`.
+
+        :param gens: list of generating Mobius transformations
+        :param beg_prefix: prefix to start at, as a string (default a)
+        :param end_prefix: prefix to end at, as a string (default b)
+        :param max_level: max level to plot
+        :param eps: tolerance for termination
+        :param channel: optional key; a later request on the same channel supersedes this one
+        :return: RenderStream over lists of complex points
+        """
+        key = ('limit', gens_key(gens), beg_prefix, end_prefix, max_level, eps)
+
+        def run(cancelled):
+            return dfs(gens, beg_prefix=beg_prefix, end_prefix=end_prefix, max_level=max_level, eps=eps,
+                       cancelled=cancelled)
+
+        return self._submit(key, run, channel)
+
+    def tiles(self, gens, circs, max_level=None, eps=VISUAL_EPS, channel=None):
+        """
+        Stream tiles, as computed by `dfs_tiles`.
+
+        :param gens: list of generating Mobius transformations
+        :param circs: seed circles to start with
+        :param max_level: max level to plot, or None for no limit
+        :param eps: minimum radius size to return
+        :param channel: optional key; a later request on the same channel supersedes this one
+        :return: RenderStream over lists of (circle, level) pairs
+        """
+        key = ('tiles', gens_key(gens), tuple(circle_key(C) for C in circs), max_level, eps)
+
+        def run(cancelled):
+            return dfs_tiles(gens, circs, max_level=max_level, eps=eps, cancelled=cancelled)
+
+        return self._submit(key, run, channel)
+
+    async def close(self):
+        """Cancel all in-flight requests and shut down the executor if we own it"""
+        self._closed = True
+        for job in list(self._jobs.values()):
+            job.cancelled.set()
+        if self._own_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _submit(self, key, run, channel):
+        if self._closed:
+            raise RuntimeError('render service is closed')
+        stream = RenderStream(self, key, run, channel)
+        if channel is not None:
+            previous = self._channels.get(channel)
+            self._channels[channel] = weakref.ref(stream)
+            previous = previous() if previous is not None else None
+            if previous is not None:
+                # a repeated request carries on with the traversal already in progress
+                job = previous._job
+                if previous.key == key and job is not None and not job.done and not job.cancelled.is_set():
+                    job.refs += 1
+                    stream._attach(job)
+                previous._supersede()
+        return stream
+
+    def _join(self, key, run):
+        """Return the in-flight job for key, starting one if needed"""
+        if self._closed:
+            raise RuntimeError('render service is closed')
+        job = self._jobs.get(key)
+        if job is None:
+            job = _Job(key)
+            loop = asyncio.get_running_loop()
+            # only register the job once it's actually scheduled
+            job.future = loop.run_in_executor(self._executor, self._work, loop, job, run)
+            job.future.add_done_callback(lambda future: self._finish(job, future))
+            self._jobs[key] = job
+        job.refs += 1
+        return job
+
+    def _work(self, loop, job, run):
+        """Run a traversal in a worker thread, handing chunks back to the event loop"""
+        chunk = []
+        for x in run(job.cancelled.is_set):
+            chunk.append(x)
+            if len(chunk) >= self.chunk_size:
+                if job.cancelled.is_set():
+                    return
+                loop.call_soon_threadsafe(job.push, chunk)
+                chunk = []
+        if chunk and not job.cancelled.is_set():
+            loop.call_soon_threadsafe(job.push, chunk)
+
+    def _finish(self, job, future):
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        if future.cancelled():
+            job.cancelled.set()
+            job.finish()
+        else:
+            job.finish(future.exception())
+
+    def _release(self, job):
+        job.refs -= 1
+        if job.refs == 0 and not job.done:
+            # nobody is waiting on this any more, so stop the traversal and
+            # make sure a new identical request starts afresh
+            job.cancelled.set()
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def _drop_channel(self, stream):
+        ref = self._channels.get(stream.channel)
+        if ref is not None and ref() in (stream, None):
+            del self._channels[stream.channel]
+
+
+def _release_threadsafe(loop, service, job):
+    try:
+        loop.call_soon_threadsafe(service._release, job)
+    except RuntimeError:
+        # the loop is closed, so there's nothing left to release
+        pass
+
+
+def gens_key(gens):
+    """Return a hashable key identifying a list of generators"""
+    key = []
+    for T in gens:
+        M = np.asarray(T.M)
+        key.append((M.dtype.str, M.shape, M.tobytes()))
+    return tuple(key)
+
+
+def circle_key(C):
+    """Return a hashable key identifying a circle or line"""
+    if isinstance(C, Circle):
+        return 'circle', C.center, C.radius, C.inside_pt
+    return 'line', C.direction, C.offset, C.inside_pt
+
+
+async def collect(stream):
+    """Gather all results of a stream into one list"""
+    results = []
+    async with stream:
+        async for chunk in stream:
+            results.extend(chunk)
+    return results
@@ -0,0 +1,25 @@
+from indra.plotting.limit import dfs
+from indra.plotting.tiles import dfs_tiles
+from indra.recipes import kissing_schottky, parabolic_commutator
+
+
+def test_dfs_stops_when_cancelled():
+    gens = parabolic_commutator(1.91 + 0.05j, 3)
+    full = list(dfs(gens, eps=1e-2))
+
+    pts = []
+    for z in dfs(gens, eps=1e-2, cancelled=lambda: len(pts) >= 10):
+        pts.append(z)
+
+    assert pts == full[:10]
+
+
+def test_dfs_tiles_stops_when_cancelled():
+    gens, circs = kissing_schottky(1.5, 0.5)
+    full = list(dfs_tiles(gens, circs, 4, 1e-4))
+
+    tiles = []
+    for tile in dfs_tiles(gens, circs, 4, 1e-4, cancelled=lambda: len(tiles) >= 10):
+        tiles.append(tile)
+
+    assert tiles == full[:10]
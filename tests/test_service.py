@@ -0,0 +1,202 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import gc
+import threading
+
+import pytest
+
+from indra import service as service_module
+from indra.common import Circle, Line
+from indra.plotting.limit import dfs
+from indra.plotting.tiles import dfs_tiles
+from indra.recipes import kissing_schottky, parabolic_commutator
+from indra.service import RenderCancelled, RenderService, circle_key, collect
+
+GENS = parabolic_commutator(1.91 + 0.05j, 3)
+# small enough to finish quickly, and far too slow to finish within the tests
+FAST_EPS = 1e-2
+SLOW_EPS = 1e-7
+TINY = dict(eps=1e-1, max_level=5)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class CountingTraversal:
+    """Wraps a traversal to count its runs, holding each run until released"""
+
+    def __init__(self, fct):
+        self.fct = fct
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        self.gate.wait()
+        yield from self.fct(*args, **kwargs)
+
+
+@pytest.fixture
+def counted_dfs(monkeypatch):
+    traversal = CountingTraversal(dfs)
+    monkeypatch.setattr(service_module, 'dfs', traversal)
+    return traversal
+
+
+@pytest.fixture
+def counted_dfs_tiles(monkeypatch):
+    traversal = CountingTraversal(dfs_tiles)
+    monkeypatch.setattr(service_module, 'dfs_tiles', traversal)
+    return traversal
+
+
+async def assert_worker_free(service):
+    """The single worker must be free to run a tiny request promptly"""
+    await asyncio.wait_for(collect(service.limit_set(GENS, **TINY)), timeout=5)
+
+
+def test_identical_requests_share_traversal(counted_dfs):
+    async def main():
+        counted_dfs.gate.clear()
+        async with RenderService(chunk_size=100) as service:
+            s1 = service.limit_set(GENS, eps=FAST_EPS)
+            s2 = service.limit_set(GENS, eps=FAST_EPS)
+            results = asyncio.gather(collect(s1), collect(s2))
+            # let both streams join before the traversal produces anything
+            await asyncio.sleep(0.05)
+            counted_dfs.gate.set()
+            return await results
+
+    r1, r2 = run(main())
+    expected = list(dfs(GENS, eps=FAST_EPS))
+    assert r1 == expected
+    assert r2 == expected
+    assert counted_dfs.calls == 1
+
+
+def test_repeated_request_on_channel_keeps_traversal(counted_dfs):
+    async def main():
+        async with RenderService(chunk_size=100) as service:
+            a = service.limit_set(GENS, eps=SLOW_EPS, channel='view')
+            first = await a.__anext__()
+
+            b = service.limit_set(GENS, eps=SLOW_EPS, channel='view')
+            with pytest.raises(RenderCancelled):
+                await a.__anext__()
+            async with b:
+                assert await b.__anext__() == first
+                await b.__anext__()
+
+    run(main())
+    assert counted_dfs.calls == 1
+
+
+def test_superseded_request_is_cancelled():
+    async def main():
+        async with RenderService(executor=ThreadPoolExecutor(1)) as service:
+            old = service.limit_set(GENS, eps=SLOW_EPS, channel='view')
+            await old.__anext__()
+
+            new = service.limit_set(GENS, eps=FAST_EPS, channel='view')
+            with pytest.raises(RenderCancelled):
+                await old.__anext__()
+            result = await asyncio.wait_for(collect(new), timeout=5)
+            assert result == list(dfs(GENS, eps=FAST_EPS))
+
+    run(main())
+
+
+def test_broken_out_stream_is_cancelled():
+    async def main():
+        async with RenderService(executor=ThreadPoolExecutor(1)) as service:
+            async with service.limit_set(GENS, eps=SLOW_EPS) as stream:
+                async for _ in stream:
+                    break
+            await assert_worker_free(service)
+
+    run(main())
+
+
+def test_dropped_stream_is_cancelled():
+    async def main():
+        async with RenderService(executor=ThreadPoolExecutor(1)) as service:
+            stream = service.limit_set(GENS, eps=SLOW_EPS)
+            await stream.__anext__()
+            del stream
+            gc.collect()
+            await assert_worker_free(service)
+
+    run(main())
+
+
+def test_cancelled_consumer_cancels_traversal():
+    async def main():
+        async with RenderService(executor=ThreadPoolExecutor(1)) as service:
+            task = asyncio.create_task(collect(service.limit_set(GENS, eps=SLOW_EPS)))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await assert_worker_free(service)
+
+    run(main())
+
+
+def test_unstarted_stream_does_no_work(counted_dfs):
+    async def main():
+        async with RenderService() as service:
+            service.limit_set(GENS, eps=SLOW_EPS)
+            await asyncio.sleep(0.05)
+
+    run(main())
+    assert counted_dfs.calls == 0
+
+
+def test_errors_reach_consumer():
+    async def main():
+        async with RenderService() as service:
+            with pytest.raises(ValueError):
+                await collect(service.limit_set(GENS, beg_prefix='b', end_prefix='a'))
+
+    run(main())
+
+
+def test_closed_service_refuses_requests():
+    async def main():
+        service = RenderService()
+        await service.close()
+        with pytest.raises(RuntimeError):
+            service.limit_set(GENS, eps=FAST_EPS)
+
+    run(main())
+
+
+def test_tiles(counted_dfs_tiles):
+    gens, circs = kissing_schottky(1.5, 0.5)
+
+    async def main():
+        counted_dfs_tiles.gate.clear()
+        async with RenderService(chunk_size=50) as service:
+            results = asyncio.gather(
+                collect(service.tiles(gens, circs, max_level=4)),
+                collect(service.tiles(gens, circs, max_level=4)),
+            )
+            await asyncio.sleep(0.05)
+            counted_dfs_tiles.gate.set()
+            return await results
+
+    t1, t2 = run(main())
+    expected = list(dfs_tiles(gens, circs, 4, 1e-4))
+    assert [(repr(C), level) for C, level in t1] == [(repr(C), level) for C, level in expected]
+    assert [(repr(C), level) for C, level in t2] == [(repr(C), level) for C, level in expected]
+    assert counted_dfs_tiles.calls == 1
+
+
+def test_circle_key():
+    assert circle_key(Circle(1j, 2)) == circle_key(Circle(1j, 2))
+    assert circle_key(Circle(1j, 2)) != circle_key(Circle(1j, 2, inside_pt=5))
+    assert circle_key(Line(0.5, 1)) == circle_key(Line(0.5, 1))
+    assert circle_key(Line(0.5, 1)) != circle_key(Line(0.5 + 1e-15, 1))
+    assert circle_key(Line(0.5, 1)) != circle_key(Line(0.5, 1, inside_pt=3))